@@ -7,6 +7,7 @@ import sys
 import json
 import base64
 import ssl
+import signal
 from typing import Optional
 
 try:
@@ -18,6 +19,9 @@ except ImportError:
 
 # Import uploaders
 from certs4devices.uploaders import MikroTikUploader, ReolinkUploader
+from certs4devices.profiling import RunProfiler
+from certs4devices.server import PushServer
+from certs4devices.coordination import LeaseCoordinator
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -320,6 +324,29 @@ class K8sResourceManager:
             logger.error(f"Failed to ensure DNSEndpoint {dns_endpoint_name}: {e}")
             return False
 
+def parse_bool(value, default: bool = False) -> bool:
+    """Parse a boolean device config value given as a JSON bool or as a "true"/"false" string"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', 'yes', 'on', '1'):
+        return True
+    if text in ('false', 'no', 'off', '0', ''):
+        return False
+    raise Exception(f"Invalid boolean value: {value!r}")
+
+def parse_list(value) -> list:
+    """Parse a list device config value given as a JSON list or as a comma-separated string"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    raise Exception(f"Invalid list value: {value!r}")
+
 async def process_device(device_config: dict, k8s_manager: K8sResourceManager, ensure_resources: bool = True, issuer_name: str = "letsencrypt-prod", issuer_kind: str = "Issuer", domain_suffix: str = ".adviser.com") -> bool:
     """Process a single device (router/camera) from configuration"""
     device_name = device_config['name']
@@ -360,7 +387,11 @@ async def process_device(device_config: dict, k8s_manager: K8sResourceManager, e
                 username=device_config['username'],
                 password=password,
                 port=port,
-                ssl_port=ssl_port
+                ssl_port=ssl_port,
+                cleanup=parse_bool(device_config.get('cleanup'), True),
+                rebind_services=parse_list(device_config.get('rebind_services')),
+                transfer=device_config.get('transfer', 'auto'),
+                ssh_port=int(device_config.get('ssh_port', 22))
             )
         elif device_type.lower() == 'reolink':
             uploader = ReolinkUploader(
@@ -368,7 +399,8 @@ async def process_device(device_config: dict, k8s_manager: K8sResourceManager, e
                 username=device_config['username'],
                 password=password,
                 port=int(device_config.get('https_port', 443)),
-                relogin_delay=float(device_config.get('relogin_delay', 5.0))
+                relogin_delay=float(device_config.get('relogin_delay', 5.0)),
+                full_host_data=parse_bool(device_config.get('full_host_data'), False)
             )
         else:
             logger.error(f"Unsupported device type: {device_type}")
@@ -405,13 +437,42 @@ async def main():
     parser.add_argument('--issuer', default='letsencrypt-prod', help='cert-manager Issuer name')
     parser.add_argument('--issuer-kind', default='Issuer', choices=['Issuer', 'ClusterIssuer'], help='cert-manager Issuer kind (Issuer or ClusterIssuer)')
     parser.add_argument('--domain-suffix', default='.adviser.com', help='Domain suffix for DNS names')
+    parser.add_argument('--serve', action='store_true', help='Run an HTTP API that pushes certificates to single devices on demand')
+    parser.add_argument('--listen-host', default='0.0.0.0', help='Address the HTTP API listens on in serve mode')
+    parser.add_argument('--listen-port', type=int, default=8080, help='Port the HTTP API listens on in serve mode')
+    parser.add_argument('--workers', type=int, default=1, help='Number of devices pushed concurrently in serve mode')
+    parser.add_argument('--reconcile-interval', type=float, help='Seconds between pushes of all (owned) devices in serve mode; default is to push on demand only')
+    parser.add_argument('--ha', action='store_true', help='Coordinate several serve-mode replicas through Kubernetes Lease objects')
+    parser.add_argument('--replica-id', help='Unique replica identity for --ha (default: pod hostname)')
+    parser.add_argument('--lease-duration', type=int, default=15, help='Seconds a replica or device lease stays valid without renewal')
+    parser.add_argument('--profile', metavar='DIR', help='Write cProfile data, asyncio task dumps and an event-loop blocking report to DIR')
+    parser.add_argument('--profile-interval', type=float, default=10.0, help='Seconds between asyncio task dumps when profiling')
+    parser.add_argument('--profile-threshold', type=float, default=0.5, help='Seconds the event loop may be blocked before it is reported when profiling')
     parser.add_argument('--verbose', '-v', action='store_true')
 
     args = parser.parse_args()
 
+    if args.profile and args.serve:
+        # Serve-mode pushes run in worker threads with their own event loops,
+        # which the main-thread profiler cannot see
+        parser.error("--profile cannot be combined with --serve")
+
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
+    profiler = None
+    if args.profile:
+        profiler = RunProfiler(args.profile, task_dump_interval=args.profile_interval, block_threshold=args.profile_threshold)
+        await profiler.start()
+
+    try:
+        await run(args, profiler)
+    finally:
+        if profiler:
+            await profiler.stop()
+
+async def run(args: argparse.Namespace, profiler: Optional[RunProfiler] = None):
+    """Process all devices from the configuration file"""
     # Check if kubernetes client is available
     if not K8S_AVAILABLE:
         logger.error("kubernetes python client not available. Install with: pip install kubernetes")
@@ -449,9 +510,53 @@ async def main():
     print(f"Auto-create resources: {ensure_resources}")
     print(f"{'='*60}\n")
 
+    if args.serve:
+        def push(device: dict) -> bool:
+            # Runs in a PushServer worker thread with its own event loop, so
+            # blocking device and Kubernetes calls do not stall the HTTP API
+            return asyncio.run(process_device(
+                device,
+                k8s_manager,
+                ensure_resources=ensure_resources,
+                issuer_name=args.issuer,
+                issuer_kind=args.issuer_kind,
+                domain_suffix=args.domain_suffix
+            ))
+
+        coordinator = None
+        if args.ha:
+            coordinator = LeaseCoordinator(namespace=args.namespace, identity=args.replica_id, lease_duration=args.lease_duration)
+            coordinator.start()
+
+        server = PushServer(
+            devices,
+            push,
+            host=args.listen_host,
+            port=args.listen_port,
+            workers=args.workers,
+            coordinator=coordinator,
+            reconcile_interval=args.reconcile_interval
+        )
+        # Cancel on SIGTERM so the finally below runs and the replica leaves the ring
+        # right away instead of other replicas waiting for its lease to expire
+        serve_task = asyncio.ensure_future(server.serve_forever())
+        loop = asyncio.get_event_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, serve_task.cancel)
+        try:
+            await serve_task
+        except asyncio.CancelledError:
+            logger.info("Shutting down push server")
+        finally:
+            if coordinator:
+                coordinator.stop()
+        return
+
     # Process each device
     results = []
     for device in devices:
+        if profiler:
+            profiler.set_device(device['name'])
         success = await process_device(
             device,
             k8s_manager,
@@ -462,6 +567,9 @@ async def main():
         )
         results.append((device['name'], success))
 
+    if profiler:
+        profiler.set_device(None)
+
     # Summary
     print(f"\n{'='*60}")
     print("SUMMARY")
@@ -0,0 +1,303 @@
+"""Replica coordination through Kubernetes Lease objects"""
+import bisect
+import datetime
+import hashlib
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    from kubernetes import client
+    from kubernetes.client.rest import ApiException
+    K8S_AVAILABLE = True
+except ImportError:
+    K8S_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MEMBER_LABEL = 'certs4devices/member-of'
+
+
+def _hash(key: str) -> int:
+    return int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def lease_name(*parts: str) -> str:
+    """
+    Build a valid Kubernetes object name (DNS-1123 subdomain) from arbitrary parts
+
+    Names that had to be changed get a short hash of the original appended,
+    so distinct device names never map to the same lease.
+    """
+    raw = '-'.join(parts)
+    name = re.sub(r'[^a-z0-9.-]+', '-', raw.lower()).strip('-.')
+    if name != raw or len(name) > 253:
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:10]
+        name = f"{name[:240].rstrip('-.')}-{digest}".lstrip('-.')
+    return name
+
+
+class HashRing:
+    """Consistent hash ring mapping device names to replica identities"""
+
+    def __init__(self, members: List[str], vnodes: int = 64):
+        """
+        Build the ring
+
+        Args:
+            members: Identities of the live replicas
+            vnodes: Virtual nodes per replica, evens out the share of each replica (default 64)
+        """
+        self.members = sorted(members)
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self._keys = [key for key, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, device_name: str) -> Optional[str]:
+        """Return the replica identity responsible for a device, or None if the ring is empty"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(device_name)) % len(self._keys)
+        return self._owners[index]
+
+
+class LeaseCoordinator:
+    """
+    Coordinates several replicas of the uploader through Kubernetes Leases
+
+    Every replica keeps a membership Lease renewed; the set of unexpired
+    membership Leases forms a consistent hash ring that partitions devices
+    across replicas. Before a device is pushed its device Lease has to be
+    acquired, so no device is ever pushed by two replicas at once, even
+    while ownership is moving between replicas.
+
+    Renewal runs in a background thread so leases stay valid while a
+    synchronous device call holds the event loop.
+
+    Like client-go's leader election, expiry of another replica's lease is
+    judged by when this replica last saw the lease change, on the local
+    monotonic clock, never by comparing renewTime written with the other
+    replica's clock; clock skew between nodes cannot make a live lease look
+    expired.
+    """
+
+    def __init__(self, namespace: str = "default", identity: Optional[str] = None, lease_prefix: str = "certs4devices", lease_duration: int = 15):
+        """
+        Initialize the coordinator
+
+        Args:
+            namespace: Namespace the Lease objects live in
+            identity: Unique replica identity (default: pod hostname)
+            lease_prefix: Name prefix for all Lease objects (default certs4devices)
+            lease_duration: Seconds a lease stays valid without renewal (default 15)
+        """
+        if not K8S_AVAILABLE:
+            raise Exception("kubernetes python client not available")
+
+        self.api = client.CoordinationV1Api()
+        self.namespace = namespace
+        self.identity = identity or os.environ.get('HOSTNAME') or socket.gethostname()
+        self.lease_prefix = lease_prefix
+        self.lease_duration = lease_duration
+        self.ring = HashRing([])
+        self._held: Dict[str, str] = {}
+        self._observed: Dict[str, tuple] = {}
+        self._member_leases = set()
+        self._watched: List[str] = []
+        self._on_gain: Optional[Callable[[List[str]], None]] = None
+        self._lock = threading.Lock()
+        # Serializes device lease renewal against release, so a renewal never races a delete
+        self._device_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def member_lease_name(self) -> str:
+        return lease_name(self.lease_prefix, 'member', self.identity)
+
+    def device_lease_name(self, device_name: str) -> str:
+        return lease_name(self.lease_prefix, 'device', device_name)
+
+    def watch(self, device_names: List[str], on_gain: Callable[[List[str]], None]):
+        """
+        Report devices this replica gains when the ring changes
+
+        Args:
+            device_names: Devices to track
+            on_gain: Called from the renewal thread with the newly owned devices
+        """
+        self._watched = list(device_names)
+        self._on_gain = on_gain
+
+    def start(self):
+        """Join the ring and start renewing leases in the background"""
+        self._renew()
+        self._thread = threading.Thread(target=self._run, name='lease-coordinator', daemon=True)
+        self._thread.start()
+        logger.info(f"Joined replica ring as {self.identity} ({len(self.ring.members)} live replica(s))")
+
+    def stop(self):
+        """Stop renewing and delete our leases so the remaining replicas rebalance immediately"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.lease_duration)
+        with self._lock:
+            held = list(self._held)
+        for device_name in held:
+            self.release_device(device_name)
+        try:
+            self.api.delete_namespaced_lease(self.member_lease_name, self.namespace)
+            logger.info(f"Left replica ring as {self.identity}")
+        except ApiException as e:
+            logger.warning(f"Failed to delete member lease {self.member_lease_name}: {e}")
+
+    def owns(self, device_name: str) -> bool:
+        """Return True if this replica is responsible for the device"""
+        with self._lock:
+            return self.ring.owner(device_name) == self.identity
+
+    def acquire_device(self, device_name: str) -> bool:
+        """
+        Take the device lease before pushing to the device
+
+        Returns:
+            True if this replica now holds the lease, False if another replica does
+        """
+        name = self.device_lease_name(device_name)
+        if not self._acquire(name, labels={}):
+            return False
+        with self._lock:
+            self._held[device_name] = name
+        return True
+
+    def release_device(self, device_name: str):
+        """Release a device lease taken with acquire_device"""
+        with self._device_lock:
+            with self._lock:
+                name = self._held.pop(device_name, None)
+            if not name:
+                return
+            try:
+                lease = self.api.read_namespaced_lease(name, self.namespace)
+                if lease.spec.holder_identity != self.identity:
+                    return
+                self.api.delete_namespaced_lease(
+                    name,
+                    self.namespace,
+                    body=client.V1DeleteOptions(preconditions=client.V1Preconditions(resource_version=lease.metadata.resource_version))
+                )
+            except Exception as e:
+                # The lease expires on its own; a failed release must not fail the push
+                if getattr(e, 'status', None) not in (404, 409):
+                    logger.warning(f"Failed to release lease {name}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.lease_duration / 3):
+            try:
+                self._renew()
+            except Exception as e:
+                logger.warning(f"Lease renewal failed: {e}")
+
+    def _renew(self):
+        """Renew our member and device leases and refresh the ring from the live members"""
+        self._acquire(self.member_lease_name, labels={MEMBER_LABEL: self.lease_prefix})
+        with self._lock:
+            held = list(self._held)
+        for device_name in held:
+            with self._device_lock:
+                # Re-check: the push may have finished and released the lease meanwhile
+                with self._lock:
+                    name = self._held.get(device_name)
+                if name is None:
+                    continue
+                if not self._acquire(name, labels={}, create=False):
+                    logger.error(f"Lost device lease for {device_name} to another replica")
+                    with self._lock:
+                        self._held.pop(device_name, None)
+
+        leases = self.api.list_namespaced_lease(self.namespace, label_selector=f"{MEMBER_LABEL}={self.lease_prefix}")
+        members = [lease.spec.holder_identity for lease in leases.items
+                   if lease.spec.holder_identity and (lease.spec.holder_identity == self.identity or not self._expired(lease))]
+        listed = {lease.metadata.name for lease in leases.items}
+
+        with self._lock:
+            # Forget member leases that are gone, they are not observed again
+            for name in self._member_leases - listed:
+                self._observed.pop(name, None)
+            self._member_leases = listed
+            previous = self.ring
+            self.ring = HashRing(members)
+        if sorted(members) != previous.members:
+            logger.info(f"Replica ring changed: {sorted(members)}")
+            gained = [name for name in self._watched
+                      if self.ring.owner(name) == self.identity and previous.owner(name) != self.identity]
+            if gained and self._on_gain:
+                logger.info(f"Took over {len(gained)} device(s): {gained}")
+                self._on_gain(gained)
+
+    def _expired(self, lease) -> bool:
+        """True if the lease has not changed for its duration, as seen on the local clock"""
+        record = (lease.spec.holder_identity, lease.spec.renew_time, lease.metadata.resource_version)
+        duration = lease.spec.lease_duration_seconds or self.lease_duration
+        now = time.monotonic()
+        with self._lock:
+            observed = self._observed.get(lease.metadata.name)
+            if observed is None or observed[0] != record:
+                self._observed[lease.metadata.name] = (record, now)
+                return False
+            return now - observed[1] > duration
+
+    def _acquire(self, name: str, labels: dict, create: bool = True) -> bool:
+        """
+        Create or renew a lease held by this replica; fails if another replica holds it unexpired
+
+        With create=False a missing lease is not recreated, which is what
+        renewing a lease that may have been released needs.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            lease = self.api.read_namespaced_lease(name, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            if not create:
+                return False
+            body = client.V1Lease(
+                metadata=client.V1ObjectMeta(name=name, namespace=self.namespace, labels=labels),
+                spec=client.V1LeaseSpec(
+                    holder_identity=self.identity,
+                    lease_duration_seconds=self.lease_duration,
+                    acquire_time=now,
+                    renew_time=now
+                )
+            )
+            try:
+                self.api.create_namespaced_lease(self.namespace, body)
+                return True
+            except ApiException as e:
+                if e.status == 409:
+                    return False
+                raise
+
+        holder = lease.spec.holder_identity
+        if holder and holder != self.identity and not self._expired(lease):
+            return False
+
+        if holder != self.identity:
+            lease.spec.acquire_time = now
+            lease.spec.lease_transitions = (lease.spec.lease_transitions or 0) + 1
+        lease.spec.holder_identity = self.identity
+        lease.spec.lease_duration_seconds = self.lease_duration
+        lease.spec.renew_time = now
+        try:
+            # resourceVersion from the read makes this a compare-and-swap
+            self.api.replace_namespaced_lease(name, self.namespace, lease)
+            return True
+        except ApiException as e:
+            if e.status == 409:
+                return False
+            raise
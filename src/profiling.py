@@ -0,0 +1,190 @@
+"""Run profiler for diagnosing slow or stuck certificate runs"""
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RunProfiler:
+    """
+    Collects profiling data for a full run and writes it to an output directory
+
+    Produces three artifacts:
+    - profile.pstats / profile.txt: cProfile data for the whole run
+    - tasks.log: periodic dumps of all asyncio tasks and their stacks
+    - blocking.json: per-device report of callbacks that blocked the event loop
+    """
+
+    def __init__(self, output_dir: str, task_dump_interval: float = 10.0, block_threshold: float = 0.5):
+        """
+        Initialize the profiler
+
+        Args:
+            output_dir: Directory the profiling artifacts are written to
+            task_dump_interval: Seconds between asyncio task dumps (default 10.0)
+            block_threshold: Seconds the event loop may be held before a block is reported (default 0.5)
+        """
+        self.output_dir = output_dir
+        self.task_dump_interval = task_dump_interval
+        self.block_threshold = block_threshold
+        self.current_device = None
+        self.blocking = {}
+        self._profile = cProfile.Profile()
+        self._tasks = []
+        self._tasks_file = None
+        self._loop_thread_id = None
+        self._last_beat = 0.0
+        self._stall = None
+        self._report_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def set_device(self, device_name: Optional[str]):
+        """Attribute subsequent activity to the given device"""
+        self.current_device = device_name
+
+    async def start(self):
+        """Start the profiler, the task dumper and the event-loop blocking monitor"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._tasks_file = open(os.path.join(self.output_dir, 'tasks.log'), 'w')
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+
+        self._watchdog = threading.Thread(target=self._watch_loop, name='profiler-watchdog', daemon=True)
+        self._watchdog.start()
+        self._tasks = [
+            asyncio.ensure_future(self._heartbeat()),
+            asyncio.ensure_future(self._dump_tasks_periodically()),
+        ]
+
+        logger.info(f"Profiling enabled, writing results to {self.output_dir}")
+        self._profile.enable()
+
+    async def stop(self):
+        """Stop profiling and write all results to the output directory"""
+        self._profile.disable()
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._watchdog:
+            self._watchdog.join(timeout=1.0)
+        if self._stall is not None:
+            # The loop was still blocked when the run ended (no await since the last stall)
+            self._close_stall(time.monotonic())
+
+        self._dump_tasks()
+        self._tasks_file.close()
+        self._write_profile()
+        self._write_blocking_report()
+        logger.info(f"Profiling results written to {self.output_dir}")
+
+    async def _heartbeat(self):
+        """Keep a timestamp of the last time the event loop was responsive"""
+        interval = self.block_threshold / 2
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(interval)
+
+    def _watch_loop(self):
+        """
+        Detect stalls of the event loop from outside the loop
+
+        Stalls are measured here rather than in the heartbeat: a device that
+        never yields keeps the heartbeat from running until the next device
+        has already been selected. The device and stack are sampled while the
+        loop is blocked, and a stall spanning several devices is split into
+        one segment per device.
+        """
+        while not self._stop.wait(self.block_threshold / 10):
+            now = time.monotonic()
+            last_beat = self._last_beat
+            stall = self._stall
+
+            if now - last_beat < self.block_threshold:
+                if stall is not None:
+                    # Loop is responsive again; it ran last at last_beat
+                    self._close_stall(max(last_beat, stall['start']))
+                continue
+
+            if stall is None:
+                self._stall = {'device': self.current_device, 'start': last_beat, 'stack': self._loop_stack()}
+            elif stall['device'] != self.current_device:
+                self._close_stall(now)
+                self._stall = {'device': self.current_device, 'start': now, 'stack': self._loop_stack()}
+
+    def _loop_stack(self) -> Optional[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        return ''.join(traceback.format_stack(frame))
+
+    def _close_stall(self, end: float):
+        """Record the pending stall segment if it exceeded the threshold"""
+        stall = self._stall
+        self._stall = None
+        blocked = end - stall['start']
+        if blocked >= self.block_threshold:
+            self._record_block(stall['device'], blocked, stall['stack'])
+
+    def _record_block(self, device_name: Optional[str], blocked: float, stack: Optional[str]):
+        """Record a blocking event against a device"""
+        device_name = device_name or '<none>'
+
+        logger.warning(f"Event loop blocked for {blocked:.3f}s while processing {device_name}")
+        if stack:
+            logger.debug(f"Blocking stack:\n{stack}")
+
+        with self._report_lock:
+            report = self.blocking.setdefault(device_name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'events': []})
+            report['count'] += 1
+            report['total_seconds'] += blocked
+            report['max_seconds'] = max(report['max_seconds'], blocked)
+            report['events'].append({'seconds': round(blocked, 3), 'stack': stack})
+
+    async def _dump_tasks_periodically(self):
+        """Dump all asyncio tasks at a fixed interval"""
+        while True:
+            await asyncio.sleep(self.task_dump_interval)
+            self._dump_tasks()
+
+    def _dump_tasks(self):
+        """Write every pending asyncio task and the coroutine stack it is waiting in"""
+        out = self._tasks_file
+        out.write(f"=== {time.strftime('%Y-%m-%d %H:%M:%S')} device: {self.current_device or '<none>'} ===\n")
+        for task in asyncio.all_tasks():
+            if task in self._tasks:
+                continue
+            task.print_stack(file=out)
+        out.write('\n')
+        out.flush()
+
+    def _write_profile(self):
+        """Write the raw pstats dump and a human-readable summary"""
+        self._profile.dump_stats(os.path.join(self.output_dir, 'profile.pstats'))
+
+        summary = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=summary)
+        stats.sort_stats('cumulative').print_stats(50)
+        with open(os.path.join(self.output_dir, 'profile.txt'), 'w') as f:
+            f.write(summary.getvalue())
+
+    def _write_blocking_report(self):
+        """Write the per-device event-loop blocking report"""
+        with self._report_lock:
+            report = {
+                'threshold_seconds': self.block_threshold,
+                'devices': self.blocking,
+            }
+            with open(os.path.join(self.output_dir, 'blocking.json'), 'w') as f:
+                json.dump(report, f, indent=2)
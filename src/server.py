@@ -0,0 +1,263 @@
+"""On-demand push server: HTTP trigger endpoint feeding a deduplicating work queue"""
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+HTTP_REASONS = {
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    413: 'Payload Too Large',
+}
+
+# The API takes no request bodies; anything larger is rejected without reading it
+MAX_BODY_SIZE = 1024
+MAX_HEADERS = 100
+REQUEST_TIMEOUT = 10.0
+
+
+class PushServer:
+    """
+    Small HTTP API that queues single-device certificate pushes
+
+    Endpoints:
+    - POST /devices/{name}/push: queue a push for one device
+    - GET /status: queue and per-device push state
+
+    Repeated triggers for a device that is already waiting in the queue are
+    deduplicated. Queued devices are processed by a bounded pool of workers,
+    and a device is never pushed by two workers at the same time. Pushes run
+    in a thread pool because the device and Kubernetes clients are
+    synchronous; the HTTP API stays responsive while devices are pushed.
+
+    With a coordinator, several replicas can run side by side: each one
+    reconciles only the devices it owns on the hash ring, and every push
+    is guarded by the device lease.
+    """
+
+    def __init__(self, devices: list, push: Callable[[dict], bool], host: str = "0.0.0.0", port: int = 8080, workers: int = 1, coordinator=None, reconcile_interval: Optional[float] = None):
+        """
+        Initialize the push server
+
+        Args:
+            devices: Device configurations from the config file
+            push: Blocking function that pushes the certificate to one device
+            host: Address to listen on (default 0.0.0.0)
+            port: Port to listen on (default 8080)
+            workers: Number of concurrent device pushes (default 1)
+            coordinator: LeaseCoordinator shared with other replicas (default None)
+            reconcile_interval: Seconds between pushes of all owned devices, None to only push on demand
+        """
+        self.devices = {device['name']: device for device in devices}
+        self.push = push
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='push')
+        self.coordinator = coordinator
+        self.reconcile_interval = reconcile_interval
+        self.queue = asyncio.Queue()
+        self.pending = set()
+        self.running = set()
+        self.status = {name: {'state': 'idle'} for name in self.devices}
+
+    def trigger(self, device_name: str) -> bool:
+        """
+        Queue a push for a device
+
+        A device that is being pushed right now is not put on the queue again;
+        the worker re-queues it once the running push has finished, so no
+        worker sits blocked waiting for it.
+
+        Returns:
+            True if the device was queued, False if it was already waiting in the queue
+        """
+        if device_name in self.pending:
+            logger.info(f"Push for {device_name} already queued, ignoring duplicate trigger")
+            return False
+        self.pending.add(device_name)
+        self.status[device_name]['queued_at'] = time.time()
+        if device_name in self.running:
+            logger.info(f"Push for {device_name} is running, queued another push after it")
+        else:
+            self.status[device_name]['state'] = 'queued'
+            self.queue.put_nowait(device_name)
+            logger.info(f"Queued push for {device_name}")
+        return True
+
+    async def _worker(self, worker_id: int):
+        """Take devices off the queue and push them one at a time"""
+        loop = asyncio.get_event_loop()
+        while True:
+            device_name = await self.queue.get()
+            # A trigger arriving from here on queues a fresh push
+            self.pending.discard(device_name)
+            self.running.add(device_name)
+            status = self.status[device_name]
+            status['started_at'] = time.time()
+            status['state'] = 'running'
+            logger.info(f"Worker {worker_id} pushing certificate to {device_name}")
+            try:
+                result = await loop.run_in_executor(self.executor, self._push_device, device_name)
+            except Exception as e:
+                logger.error(f"Push to {device_name} failed: {e}")
+                result = 'failed'
+            finally:
+                self.running.discard(device_name)
+                self.queue.task_done()
+            status['finished_at'] = time.time()
+            status['duration_seconds'] = round(status['finished_at'] - status['started_at'], 3)
+            status['last_result'] = result
+            if device_name in self.pending:
+                status['state'] = 'queued'
+                self.queue.put_nowait(device_name)
+            else:
+                status['state'] = 'idle'
+
+    def _push_device(self, device_name: str) -> str:
+        """
+        Acquire the device lease, push and release, all in one executor thread
+
+        Keeping the release in the same thread as the push guarantees the
+        lease is only given up once the push has really finished, even when
+        the worker awaiting it is cancelled on shutdown.
+        """
+        if self.coordinator and not self.coordinator.acquire_device(device_name):
+            logger.info(f"Device {device_name} is being pushed by another replica, skipping")
+            return 'skipped'
+        try:
+            return 'success' if self.push(self.devices[device_name]) else 'failed'
+        finally:
+            if self.coordinator:
+                self.coordinator.release_device(device_name)
+
+    def _trigger_all(self, device_names: list):
+        for device_name in device_names:
+            self.trigger(device_name)
+
+    async def _reconcile(self):
+        """Periodically queue every device this replica is responsible for"""
+        while True:
+            for device_name in self.devices:
+                if self.coordinator is None or self.coordinator.owns(device_name):
+                    self.trigger(device_name)
+            await asyncio.sleep(self.reconcile_interval)
+
+    def _status_body(self) -> dict:
+        body = {
+            'queue_size': self.queue.qsize(),
+            'workers': self.workers,
+            'devices': self.status,
+        }
+        if self.coordinator:
+            body['replica'] = self.coordinator.identity
+            body['replicas'] = self.coordinator.ring.members
+            body['owned_devices'] = [name for name in self.devices if self.coordinator.owns(name)]
+        return body
+
+    def _route(self, method: str, path: str):
+        """Dispatch a request and return (status code, JSON body)"""
+        parts = [part for part in path.split('?', 1)[0].split('/') if part]
+
+        if parts == ['status']:
+            if method != 'GET':
+                return 405, {'error': 'method not allowed'}
+            return 200, self._status_body()
+
+        if len(parts) == 3 and parts[0] == 'devices' and parts[2] == 'push':
+            if method != 'POST':
+                return 405, {'error': 'method not allowed'}
+            device_name = parts[1]
+            if device_name not in self.devices:
+                return 404, {'error': f'unknown device: {device_name}'}
+            queued = self.trigger(device_name)
+            return 202, {'device': device_name, 'queued': queued, 'state': self.status[device_name]['state']}
+
+        return 404, {'error': 'not found'}
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read the request line and headers; returns (request line parts, headers)"""
+        request_line = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise ValueError("too many headers")
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        return request_line, headers
+
+    async def _respond(self, reader: asyncio.StreamReader):
+        """Read one request and return (status code, JSON body)"""
+        try:
+            request_line, headers = await asyncio.wait_for(self._read_request(reader), REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            return 408, {'error': 'request timeout'}
+        except ValueError:
+            return 400, {'error': 'bad request'}
+
+        try:
+            content_length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            content_length = -1
+        if len(request_line) < 2 or content_length < 0:
+            return 400, {'error': 'bad request'}
+        if content_length > MAX_BODY_SIZE:
+            return 413, {'error': 'request body too large'}
+        if content_length:
+            try:
+                await asyncio.wait_for(reader.readexactly(content_length), REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                return 408, {'error': 'request timeout'}
+
+        return self._route(request_line[0].upper(), request_line[1])
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Handle a single HTTP/1.1 request and close the connection"""
+        try:
+            code, body = await self._respond(reader)
+            payload = json.dumps(body).encode('utf-8')
+            writer.write(
+                f"HTTP/1.1 {code} {HTTP_REASONS[code]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + payload
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Error handling HTTP request: {e}")
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        """Start the workers and the HTTP listener and run until cancelled"""
+        workers = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+        if self.reconcile_interval:
+            workers.append(asyncio.ensure_future(self._reconcile()))
+            if self.coordinator:
+                # Push devices taken over from a replica that left right away, not at the next tick
+                loop = asyncio.get_event_loop()
+                self.coordinator.watch(list(self.devices), lambda names: loop.call_soon_threadsafe(self._trigger_all, names))
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Push server listening on {self.host}:{self.port} with {self.workers} worker(s)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Let in-flight pushes finish (and release their leases) before the
+            # caller leaves the replica ring; waiting happens off the event loop
+            logger.info("Waiting for running pushes to finish")
+            await asyncio.get_event_loop().run_in_executor(None, self.executor.shutdown, True)
@@ -1,8 +1,10 @@
 """MikroTik certificate uploader"""
+import re
 import ssl
 import logging
-from typing import Optional
+from typing import List, Optional
 from .base import DeviceUploader
+from .mikrotik_transfer import MikroTikFileTransfer
 
 try:
     import librouteros
@@ -16,7 +18,7 @@ logger = logging.getLogger(__name__)
 class MikroTikUploader(DeviceUploader):
     """Certificate uploader for MikroTik routers"""
 
-    def __init__(self, host: str, username: str = "admin", password: str = "", port: int = 8728, ssl_port: int = 8729, **kwargs):
+    def __init__(self, host: str, username: str = "admin", password: str = "", port: int = 8728, ssl_port: int = 8729, cleanup: bool = True, rebind_services: Optional[List[str]] = None, transfer: str = "auto", ssh_port: int = 22, **kwargs):
         """
         Initialize MikroTik uploader
 
@@ -26,10 +28,20 @@ class MikroTikUploader(DeviceUploader):
             password: RouterOS password
             port: Plain API port (default 8728)
             ssl_port: SSL API port (default 8729)
+            cleanup: Remove stale certificates and files after import (default True)
+            rebind_services: IP services (e.g. www-ssl, api-ssl) to bind to the new certificate (default none)
+            transfer: File transfer method: auto, sftp or api (default auto)
+            ssh_port: SSH port used for SFTP transfer (default 22)
         """
         super().__init__(host, username, password, **kwargs)
         self.port = port
         self.ssl_port = ssl_port
+        self.cleanup = cleanup
+        if isinstance(rebind_services, str):
+            raise Exception("rebind_services must be a list of service names")
+        self.rebind_services = list(rebind_services or [])
+        self.transfer = transfer
+        self.ssh_port = ssh_port
         self.api_connection = None
 
     def connect_api(self) -> bool:
@@ -85,7 +97,7 @@ class MikroTikUploader(DeviceUploader):
                 logger.warning(f"Error disconnecting from API: {e}")
 
     async def certificate_import(self, filename):
-        """Import certificate or key file into RouterOS"""
+        """Import certificate or key file into RouterOS; raises if the import failed"""
         try:
             response_generator = self.api_connection.path('certificate')('import', **{
                 'file-name': filename,
@@ -93,12 +105,144 @@ class MikroTikUploader(DeviceUploader):
             })
             for response in response_generator:
                 logger.debug(f"Import response: {response}")
+                for field in ('decryption-failures', 'keys-with-no-certificate'):
+                    if str(response.get(field, 0)) not in ('0', ''):
+                        raise Exception(f"{field}={response[field]}")
         except Exception as e:
-            logger.error(f"Error importing certificate: {e}")
+            logger.error(f"Error importing certificate {filename}: {e}")
+            raise
+
+    @staticmethod
+    def _matches(name: str, cert_name: str) -> bool:
+        """True for entries created by uploads of cert_name (cert_name.crt, cert_name.crt_0, ...)"""
+        return name == cert_name or name.startswith(f"{cert_name}.")
+
+    @staticmethod
+    def _id_order(entry: dict) -> int:
+        """RouterOS .id values (*1A) grow with creation order"""
+        try:
+            return int(entry.get('.id', '*0').lstrip('*'), 16)
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def _size(entry: dict) -> int:
+        size = str(entry.get('size') or 0)
+        return int(size) if size.isdigit() else 0
+
+    @classmethod
+    def _chain(cls, certificate: dict, certificates: List[dict]) -> set:
+        """
+        Return the .ids of the issuer chain of a certificate among certificates
+
+        Issuers are matched by the CN of the issuer field against the common
+        name of the candidates; the newest candidate wins when an intermediate
+        was imported more than once.
+        """
+        chain = set()
+        current = certificate
+        while True:
+            match = re.search(r'(?:^|,)\s*CN=([^,]+)', current.get('issuer', '') or '')
+            if not match:
+                return chain
+            issuers = [c for c in certificates if c.get('common-name') == match.group(1).strip() and c['.id'] != current['.id']]
+            issuer = max(issuers, key=cls._id_order, default=None)
+            if issuer is None or issuer['.id'] in chain:
+                return chain
+            chain.add(issuer['.id'])
+            current = issuer
+
+    def collect_garbage(self, cert_name: str, previous_ids: Optional[set] = None) -> dict:
+        """
+        Remove stale certificates and files left by previous uploads of cert_name
+
+        The most recently imported certificate with a private key is kept (and
+        bound to the configured services) together with everything imported in
+        the same batch and the issuer chain of every kept certificate. If the
+        import produced no certificate with a private key, services are left
+        alone and no certificate is removed. Older
+        certificates with the same prefix that no service uses anymore are
+        removed, as are the uploaded .crt/.key files, which are not needed
+        after import.
+
+        Args:
+            cert_name: Name prefix used for the uploaded files and certificates
+            previous_ids: Certificate .ids present before this import; everything
+                else was just imported (e.g. the chain of a bundle) and is kept
+
+        Returns:
+            Dict with certificates_removed, files_removed and bytes_reclaimed
+        """
+        report = {'certificates_removed': 0, 'files_removed': 0, 'bytes_reclaimed': 0}
+        api = self.api_connection
+
+        certificates = [c for c in api.path('certificate') if self._matches(c.get('name', ''), cert_name)]
+        if previous_ids is not None:
+            imported = [c for c in certificates if c['.id'] not in previous_ids]
+        else:
+            imported = []
+        candidates = imported if previous_ids is not None else certificates
+        with_key = [c for c in candidates if str(c.get('private-key')).lower() == 'true']
+        current = max(with_key, key=self._id_order, default=None)
+        keep = {c['.id'] for c in imported}
+
+        if current is None:
+            logger.warning(f"No certificate with a private key imported for {cert_name}, leaving services and certificates unchanged")
+        else:
+            services = list(api.path('ip', 'service'))
+            try:
+                self.bind_services(current['name'], services)
+            except Exception as e:
+                logger.warning(f"Failed to bind services to certificate {current['name']}: {e}")
+
+            in_use = {svc.get('certificate') for svc in services}
+            keep.add(current['.id'])
+            keep.update(c['.id'] for c in certificates if c.get('name') in in_use)
+            # Keep the chain even when RouterOS deduplicated an unchanged re-import
+            for kept in [c for c in certificates if c['.id'] in keep]:
+                keep.update(self._chain(kept, certificates))
+            stale = [c for c in certificates if c['.id'] not in keep]
+            if stale:
+                try:
+                    api.path('certificate').remove(*[c['.id'] for c in stale])
+                    report['certificates_removed'] = len(stale)
+                except Exception as e:
+                    logger.warning(f"Failed to remove stale certificates {[c.get('name') for c in stale]}: {e}")
+
+        files = [f for f in api.path('file')
+                 if self._matches(f.get('name', ''), cert_name) and f.get('name', '').endswith(('.crt', '.key', '.pem'))]
+        if files:
+            try:
+                api.path('file').remove(*[f['.id'] for f in files])
+                report['files_removed'] = len(files)
+                report['bytes_reclaimed'] = sum(self._size(f) for f in files)
+            except Exception as e:
+                logger.warning(f"Failed to remove files {[f.get('name') for f in files]}: {e}")
+
+        logger.info(
+            f"Cleanup for {cert_name}: removed {report['certificates_removed']} certificate(s) and "
+            f"{report['files_removed']} file(s), reclaimed {report['bytes_reclaimed']} bytes"
+        )
+        return report
+
+    def bind_services(self, certificate: str, services: List[dict]):
+        """Bind the configured IP services to a certificate, updating the services list in place"""
+        if not self.rebind_services:
+            return
+        service_path = self.api_connection.path('ip', 'service')
+        for svc in services:
+            if svc.get('name') in self.rebind_services and svc.get('certificate') != certificate:
+                logger.info(f"Binding service {svc['name']} to certificate {certificate}")
+                service_path.update(**{'.id': svc['.id'], 'certificate': certificate})
+                svc['certificate'] = certificate
 
     async def upload_certificate(self, cert_content: str, key_content: str, cert_name: str = "uploaded-cert") -> bool:
         """
-        Upload certificate and key to MikroTik router via API
+        Upload certificate and key to MikroTik router
+
+        Files are written through the RouterOS API when they fit into one API
+        write, larger bundles over SFTP (or split into parts that fit the API
+        limits when SSH is not available), and then imported through the API.
 
         Args:
             cert_content: PEM-encoded certificate content
@@ -114,24 +258,33 @@ class MikroTikUploader(DeviceUploader):
             cert_filename = f"{cert_name}.crt"
             key_filename = f"{cert_name}.key"
 
-            # Clean up existing files
-            try:
-                self.api_connection.path('file').remove(cert_filename)
-                self.api_connection.path('file').remove(key_filename)
-            except:
-                pass
+            # Remove leftovers of an interrupted run so the upload does not collide
+            stale = [f for f in self.api_connection.path('file')
+                     if self._matches(f.get('name', ''), cert_name) and f.get('name', '').endswith(('.crt', '.key'))]
+            if stale:
+                self.api_connection.path('file').remove(*[f['.id'] for f in stale])
 
-            # Upload files
-            logger.info(f"Uploading certificate as {cert_filename}")
-            self.api_connection.path('file').add(name=cert_filename, contents=cert_content)
+            previous_ids = {c['.id'] for c in self.api_connection.path('certificate')} if self.cleanup else None
 
-            logger.info(f"Uploading private key as {key_filename}")
-            self.api_connection.path('file').add(name=key_filename, contents=key_content)
+            # Upload files
+            transfer = MikroTikFileTransfer(
+                self.api_connection,
+                self.host,
+                self.username,
+                self.password,
+                method=self.transfer,
+                ssh_port=self.ssh_port
+            )
+            logger.info(f"Uploading certificate and private key as {cert_filename} / {key_filename}")
+            filenames = transfer.transfer([(cert_filename, cert_content), (key_filename, key_content)])
 
-            # Import certificate
+            # Import certificate files first, then the key so it attaches to the leaf
             logger.info(f"Importing certificate {cert_name}")
-            await self.certificate_import(cert_filename)
-            await self.certificate_import(key_filename)
+            for filename in sorted(filenames, key=lambda name: name.endswith('.key')):
+                await self.certificate_import(filename)
+
+            if self.cleanup:
+                self.collect_garbage(cert_name, previous_ids)
 
             logger.info(f"Successfully uploaded certificate {cert_name}")
             return True
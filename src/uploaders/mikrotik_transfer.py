@@ -0,0 +1,211 @@
+"""Size-aware file transfer to MikroTik routers (SFTP bulk channel with RouterOS API fallback)"""
+import hashlib
+import io
+import logging
+import re
+import time
+from typing import Dict, List, Tuple
+
+try:
+    import paramiko
+    PARAMIKO_AVAILABLE = True
+except ImportError:
+    PARAMIKO_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# RouterOS truncates or rejects file contents above ~4 KiB when written through the API
+API_MAX_CONTENTS = 4000
+
+PEM_BLOCK = re.compile(r'-----BEGIN [^-]+-----.*?-----END [^-]+-----\s*', re.DOTALL)
+
+# Seconds before SFTP is tried again on a host where connecting failed
+SFTP_RETRY_AFTER = 600
+
+# Host -> time (monotonic) until which SFTP is skipped because connecting failed
+_SFTP_UNAVAILABLE: Dict[str, float] = {}
+
+
+def split_pem(name: str, content: str, limit: int = API_MAX_CONTENTS) -> List[Tuple[str, str]]:
+    """
+    Split PEM content into files that each fit into one RouterOS API write
+
+    Blocks are never cut; a bundle is split between certificates so every
+    part stays importable on its own. The first part keeps the leaf
+    certificate so the private key still matches it after import.
+
+    Args:
+        name: File name, e.g. router.crt
+        content: PEM content, possibly a full-chain bundle
+        limit: Maximum encoded size of a single part
+
+    Returns:
+        List of (file name, content) tuples
+    """
+    if len(content.encode('utf-8')) <= limit:
+        return [(name, content)]
+
+    blocks = PEM_BLOCK.findall(content)
+    if not blocks:
+        raise Exception(f"{name} is {len(content)} bytes without PEM blocks, too large for API transfer; enable SSH for SFTP transfer")
+    parts = []
+    current = ''
+    for block in blocks:
+        if len(block.encode('utf-8')) > limit:
+            raise Exception(f"{name} contains a PEM block of {len(block)} bytes, too large for API transfer; enable SSH for SFTP transfer")
+        if current and len((current + block).encode('utf-8')) > limit:
+            parts.append(current)
+            current = ''
+        current += block
+    if current:
+        parts.append(current)
+
+    stem, dot, ext = name.rpartition('.')
+    return [(f"{stem}.part{i}.{ext}" if dot else f"{name}.part{i}", part) for i, part in enumerate(parts)]
+
+
+def _sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class MikroTikFileTransfer:
+    """
+    Transfers files to a MikroTik router and verifies them after writing
+
+    Methods:
+    - sftp: single bulk write over SSH, no size limit
+    - api: RouterOS API file add, bundles split into parts below API_MAX_CONTENTS
+
+    In auto mode files that fit into one API write go through the already
+    open API connection. SFTP is only used for larger content, and the API
+    split is the fallback when SSH cannot be reached or logged into.
+    """
+
+    def __init__(self, api_connection, host: str, username: str, password: str, method: str = "auto", ssh_port: int = 22, timeout: float = 5.0):
+        """
+        Initialize the transfer
+
+        Args:
+            api_connection: Connected librouteros API
+            host: Router IP address or hostname
+            username: RouterOS username
+            password: RouterOS password
+            method: auto, sftp or api (default auto)
+            ssh_port: SSH port for SFTP (default 22)
+            timeout: SSH connect timeout in seconds (default 5.0)
+        """
+        if method not in ('auto', 'sftp', 'api'):
+            raise Exception(f"Unsupported transfer method: {method}")
+        self.api_connection = api_connection
+        self.host = host
+        self.username = username
+        self.password = password
+        self.method = method
+        self.ssh_port = ssh_port
+        self.timeout = timeout
+
+    def transfer(self, files: List[Tuple[str, str]]) -> List[str]:
+        """
+        Write files to the router and verify size and hash
+
+        Args:
+            files: List of (file name, content) tuples
+
+        Returns:
+            Names of the files written on the router, in import order
+        """
+        if self.method == 'api':
+            return self._transfer_api(files)
+
+        if self.method == 'auto':
+            fits = all(len(content.encode('utf-8')) <= API_MAX_CONTENTS for _, content in files)
+            if fits or not PARAMIKO_AVAILABLE or _SFTP_UNAVAILABLE.get(self.host, 0) > time.monotonic():
+                return self._transfer_api(files)
+
+        try:
+            ssh, sftp = self._connect_sftp()
+        except Exception as e:
+            if self.method == 'sftp':
+                raise
+            logger.info(f"SFTP to {self.host} not available ({e}), falling back to API for {SFTP_RETRY_AFTER}s")
+            _SFTP_UNAVAILABLE[self.host] = time.monotonic() + SFTP_RETRY_AFTER
+            return self._transfer_api(files)
+
+        _SFTP_UNAVAILABLE.pop(self.host, None)
+        try:
+            return self._transfer_sftp(sftp, files)
+        finally:
+            sftp.close()
+            ssh.close()
+
+    def _connect_sftp(self):
+        """Open an SSH connection and SFTP session; failures here allow falling back to the API"""
+        if not PARAMIKO_AVAILABLE:
+            raise Exception("paramiko not available")
+
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            ssh.connect(
+                self.host,
+                port=self.ssh_port,
+                username=self.username,
+                password=self.password,
+                timeout=self.timeout,
+                look_for_keys=False,
+                allow_agent=False
+            )
+            return ssh, ssh.open_sftp()
+        except Exception:
+            ssh.close()
+            raise
+
+    def _transfer_sftp(self, sftp, files: List[Tuple[str, str]]) -> List[str]:
+        """Write and verify files over SFTP; partially written files are removed on failure"""
+        written = []
+        try:
+            for name, content in files:
+                data = content.encode('utf-8')
+                logger.info(f"Uploading {name} via SFTP ({len(data)} bytes)")
+                written.append(name)
+                sftp.putfo(io.BytesIO(data), name, file_size=len(data), confirm=True)
+
+                readback = io.BytesIO()
+                sftp.getfo(name, readback)
+                if _sha256(readback.getvalue()) != _sha256(data):
+                    raise Exception(f"Hash mismatch after writing {name} via SFTP")
+        except Exception:
+            for name in written:
+                try:
+                    sftp.remove(name)
+                except Exception as e:
+                    logger.warning(f"Failed to remove partial file {name}: {e}")
+            raise
+        return [name for name, _ in files]
+
+    def _transfer_api(self, files: List[Tuple[str, str]]) -> List[str]:
+        parts = [part for name, content in files for part in split_pem(name, content)]
+        file_path = self.api_connection.path('file')
+
+        for name, content in parts:
+            logger.info(f"Uploading {name} via API ({len(content.encode('utf-8'))} bytes)")
+            file_path.add(name=name, contents=content)
+
+        self._verify_api(parts)
+        return [name for name, _ in parts]
+
+    def _verify_api(self, parts: List[Tuple[str, str]]):
+        """Check size and, where RouterOS returns it, content hash of the written files"""
+        expected: Dict[str, bytes] = {name: content.encode('utf-8') for name, content in parts}
+        found = {f.get('name'): f for f in self.api_connection.path('file') if f.get('name') in expected}
+
+        for name, data in expected.items():
+            entry = found.get(name)
+            if entry is None:
+                raise Exception(f"{name} missing on router after upload")
+            size = entry.get('size')
+            if size is not None and str(size).isdigit() and int(size) != len(data):
+                raise Exception(f"{name} has {size} bytes on router, expected {len(data)}")
+            contents = entry.get('contents')
+            if contents is not None and _sha256(contents.encode('utf-8')) != _sha256(data):
+                raise Exception(f"Hash mismatch after writing {name} via API")
@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 class ReolinkUploader(DeviceUploader):
     """Certificate uploader for Reolink cameras using reolink-aio library"""
 
-    def __init__(self, host: str, username: str = "admin", password: str = "", port: int = 443, relogin_delay: float = 5.0, **kwargs):
+    def __init__(self, host: str, username: str = "admin", password: str = "", port: int = 443, relogin_delay: float = 5.0, full_host_data: bool = False, **kwargs):
         """
         Initialize Reolink uploader
 
@@ -24,11 +24,14 @@ class ReolinkUploader(DeviceUploader):
             password: Camera password
             port: HTTPS port (default 443)
             relogin_delay: Seconds to wait before re-login after clearing certs (default 5.0)
+            full_host_data: Retrieve full host data (channels, abilities, settings) before
+                uploading, instead of only logging in (default False)
             **kwargs: Additional parameters
         """
         super().__init__(host, username, password, **kwargs)
         self.port = port
         self.relogin_delay = relogin_delay
+        self.full_host_data = full_host_data
         self.reolink_host = None
 
     async def upload_certificate(self, cert_content: str, key_content: str, cert_name: str = "server") -> bool:
@@ -67,14 +70,21 @@ class ReolinkUploader(DeviceUploader):
                 protocol="https"
             )
 
-            # Login and get host data (initializes connection)
-            logger.info("Logging in and retrieving camera information...")
-            await self.reolink_host.get_host_data()
-
-            logger.info(f"Connected to {self.reolink_host.nvr_name} (model: {self.reolink_host.model})")
+            if self.full_host_data:
+                # Login and get host data (fans out into many requests on multi-channel NVRs)
+                logger.info("Logging in and retrieving camera information...")
+                await self.reolink_host.get_host_data()
+                device_label = self.reolink_host.nvr_name
+                logger.info(f"Connected to {device_label} (model: {self.reolink_host.model})")
+            else:
+                # Only authenticate, the certificate upload needs nothing else
+                logger.info("Logging in...")
+                await self.reolink_host.login()
+                device_label = self.host
+                logger.info(f"Connected to {device_label}")
 
             # Upload certificate using the complete workflow
-            logger.info(f"Uploading certificate to {self.reolink_host.nvr_name}...")
+            logger.info(f"Uploading certificate to {device_label}...")
             success = await self.reolink_host.upload_certificate(
                 cert_content=cert_content,
                 key_content=key_content,
@@ -83,10 +93,10 @@ class ReolinkUploader(DeviceUploader):
             )
 
             if success:
-                logger.info(f"Successfully uploaded certificate to {self.reolink_host.nvr_name}")
+                logger.info(f"Successfully uploaded certificate to {device_label}")
                 logger.warning("Note: Some Reolink models may require a reboot to activate the certificate")
             else:
-                logger.error(f"Failed to upload certificate to {self.reolink_host.nvr_name}")
+                logger.error(f"Failed to upload certificate to {device_label}")
 
             return success
 